@@ -1,7 +1,8 @@
 from django.contrib import admin
 
-from api.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
-                        ShoppingCart, Tag, TagQuantity)
+from api.models import (Favorite, FeedEntry, Ingredient, IngredientQuantity,
+                        Recipe, ShoppingCart, ShoppingListItem, Tag,
+                        TagQuantity)
 
 
 @admin.register(Tag)
@@ -18,12 +19,14 @@ class IngredientAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'author', 'quantity_favorites')
+    list_display = ('id', 'name', 'author', 'quantity_favorites',
+                    'carts_count')
     list_filter = ('author', 'name', 'tags')
     search_fields = ('name',)
 
+    @admin.display(description='В избранном', ordering='favorites_count')
     def quantity_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 @admin.register(IngredientQuantity)
@@ -36,11 +39,36 @@ class TagQuantityAdmin(admin.ModelAdmin):
     extra = 0
 
 
+# Счетчики рецептов и списки покупок обновляются при добавлении и
+# удалении строк, поэтому перенос строки на другой рецепт или к другому
+# пользователю запрещен.
+class NoChangeAdmin(admin.ModelAdmin):
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(NoChangeAdmin):
     list_display = ('id', 'user', 'recipe')
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(NoChangeAdmin):
     list_display = ('id', 'user', 'recipe')
+
+
+# Список покупок собирается из корзин и доступен только для просмотра.
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(NoChangeAdmin):
+    list_display = ('id', 'user', 'ingredient', 'amount')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'recipe', 'pub_date')
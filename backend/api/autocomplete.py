@@ -0,0 +1,60 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .models import Ingredient
+
+
+class IngredientIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+
+    def build(self):
+        rows = sorted(
+            (name.lower(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit')
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        return time.monotonic(), keys, items
+
+    def is_fresh(self, data):
+        # Сигналы сбрасывают индекс только в своем процессе, а load_ingrs
+        # и другие воркеры меняют базу без них, поэтому индекс живет
+        # ограниченное время.
+        return data is not None and (
+            time.monotonic() - data[0] < settings.INGREDIENT_INDEX_TIMEOUT
+        )
+
+    def load(self):
+        data = self._data
+        if not self.is_fresh(data):
+            with self._lock:
+                if not self.is_fresh(self._data):
+                    self._data = self.build()
+                data = self._data
+        return data
+
+    def invalidate(self):
+        self._data = None
+
+    def search(self, prefix, limit=None):
+        if limit is None:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        _, keys, items = self.load()
+        prefix = prefix.lower()
+        start = bisect_left(keys, prefix)
+        # Точное совпадение короче остальных строк с тем же префиксом,
+        # поэтому при сортировке оно всегда оказывается первым.
+        end = bisect_left(keys, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        return items[start:min(end, start + limit)]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import (parse_etags, patch_cache_control,
+                                patch_vary_headers)
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_version(name):
+    return cache.get_or_set(f'{name}:version', time.time_ns, None)
+
+
+def bump_version(name):
+    version = time.time_ns()
+    cache.set(f'{name}:version', version, None)
+    return version
+
+
+def invalidate_recipes(recipe_ids):
+    recipe_ids = list(recipe_ids)
+
+    def bump():
+        for recipe_id in recipe_ids:
+            bump_version(f'recipe:{recipe_id}')
+
+    # Версия меняется после коммита, иначе параллельный запрос успеет
+    # положить в кэш старые данные под новой версией.
+    transaction.on_commit(bump)
+
+
+# Запросы к одному ключу ждут, пока первый из них соберет значение,
+# а не идут в базу одновременно.
+BUILD_LOCKS = tuple(threading.Lock() for _ in range(64))
+
+
+def get_or_build(key, build, timeout, is_valid=lambda payload: True):
+    payload = cache.get(key)
+    if payload is not None and is_valid(payload):
+        return payload
+    with BUILD_LOCKS[hash(key) % len(BUILD_LOCKS)]:
+        payload = cache.get(key)
+        if payload is None or not is_valid(payload):
+            payload = build()
+            cache.set(key, payload, timeout)
+    return payload
+
+
+class CachedListMixin:
+    cache_name = None
+
+    def get_cached_list(self):
+        key = f'{self.cache_name}:list:{get_version(self.cache_name)}'
+        payload = cache.get(key)
+        if payload is None:
+            data = self.get_serializer(
+                self.filter_queryset(self.get_queryset()), many=True
+            ).data
+            digest = hashlib.sha1(
+                json.dumps(data, sort_keys=True).encode()
+            ).hexdigest()
+            payload = (digest, data)
+            # Версия хранится в кэше процесса, а load_tags, load_ingrs и
+            # другие воркеры меняют базу без нее, поэтому список живет
+            # ограниченное время.
+            cache.set(key, payload, settings.CATALOG_CACHE_TIMEOUT)
+        return payload
+
+    def list(self, request, *args, **kwargs):
+        digest, data = self.get_cached_list()
+        etag = f'"{digest}-{request.accepted_renderer.format}"'
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE
+        )
+        patch_vary_headers(response, ['Accept'])
+        return response
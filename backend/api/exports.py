@@ -0,0 +1,53 @@
+import csv
+import json
+
+from .pdf import get_shopping_cart_pdf, iter_chunks
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def iter_pdf(ingredients):
+    return iter_chunks(get_shopping_cart_pdf(ingredients))
+
+
+def iter_text(ingredients):
+    yield 'Список покупок:\n'
+    for number, item in enumerate(ingredients, start=1):
+        yield (
+            f'{number}. {item["ingredient__name"]} - '
+            f'{item["ingredient_total"]} '
+            f'{item["ingredient__measurement_unit"]}\n'
+        )
+
+
+def iter_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in ingredients:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['ingredient_total'],
+        ))
+
+
+def iter_json(ingredients):
+    yield '['
+    for number, item in enumerate(ingredients):
+        yield ',' * bool(number) + json.dumps({
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['ingredient_total'],
+        }, ensure_ascii=False)
+    yield ']'
+
+
+EXPORTERS = {
+    'pdf': iter_pdf,
+    'txt': iter_text,
+    'csv': iter_csv,
+    'json': iter_json,
+}
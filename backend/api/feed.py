@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db import transaction
+
+from users.models import Follow
+from .models import FeedEntry, Recipe
+
+
+def create_entries(rows):
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for user_id, recipe_id, pub_date in rows
+        ),
+        batch_size=settings.FEED_INBOX_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def add_recipe_to_feeds(recipe):
+    create_entries(
+        (user_id, recipe.pk, recipe.pub_date)
+        for user_id in Follow.objects.filter(
+            following_id=recipe.author_id
+        ).values_list('user_id', flat=True).iterator()
+    )
+
+
+def add_author_to_feed(user_id, author_id):
+    recipes = Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list('id', 'pub_date')
+    create_entries(
+        (user_id, recipe_id, pub_date)
+        for recipe_id, pub_date in recipes[:settings.FEED_INBOX_BACKFILL]
+    )
+
+
+def remove_author_from_feed(user_id, author_id):
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id).delete()
+
+
+@transaction.atomic
+def rebuild_feeds():
+    FeedEntry.objects.all().delete()
+    create_entries(Recipe.objects.filter(
+        author__following__isnull=False
+    ).values_list('author__following__user', 'id', 'pub_date').iterator())
+    return FeedEntry.objects.count()
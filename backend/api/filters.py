@@ -1,25 +1,52 @@
-from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
+from django.db.models import Count, Exists, OuterRef
+from django_filters.rest_framework import (DjangoFilterBackend, FilterSet,
+                                           filters)
 
-from api.models import Recipe
+from api.models import Recipe, Tag, TagQuantity
+from api.search import search_recipes
 from users.models import User
 
-
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
+POPULAR_ORDERING = ('-favorites_count', '-pub_date', '-id')
+ORDERING_CHOICES = (('popular', 'По популярности'),)
 
 
 class RecipeFilter(FilterSet):
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.ModelMultipleChoiceFilter(
+        queryset=Tag.objects.all(),
+        to_field_name='slug',
+        method='get_tags'
+    )
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=ORDERING_CHOICES, method='get_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering')
+
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(TagQuantity.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value)))
+
+    def get_tag_counts(self):
+        # Теги не фильтруют сами себя: счетчик показывает, сколько
+        # рецептов останется, если выбрать тег при остальных фильтрах.
+        queryset = self.queryset
+        for name, value in self.form.cleaned_data.items():
+            if name != 'tags':
+                queryset = self.filters[name].filter(queryset, value)
+        return dict(TagQuantity.objects.filter(
+            recipe__in=queryset.order_by().values('pk')
+        ).order_by().values_list('tag__slug').annotate(total=Count('pk')))
 
     def get_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
@@ -30,3 +57,17 @@ class RecipeFilter(FilterSet):
         if self.request.user.is_authenticated and value:
             return queryset.filter(carts__user=self.request.user)
         return queryset.all()
+
+    def get_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*POPULAR_ORDERING)
+
+
+class FilterSetBackend(DjangoFilterBackend):
+    def get_filterset(self, request, queryset, view):
+        view.filterset = super().get_filterset(request, queryset, view)
+        return view.filterset
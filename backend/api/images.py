@@ -0,0 +1,136 @@
+import base64
+import binascii
+import io
+import logging
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import connection, transaction
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from PIL import Image, features
+from rest_framework import serializers
+
+from .cache import invalidate_recipes
+from .models import Recipe
+
+CHUNK_SIZE = 4 * 64 * 1024
+# b64decode без validate отбрасывает такие символы, например переносы
+# строк MIME.
+NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+RENDITIONS_DIR = 'recipes/image/renditions'
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=max(settings.RECIPE_IMAGE_WORKERS, 1),
+    thread_name_prefix='recipe-images'
+)
+
+
+class ChunkedBase64ImageField(Base64ImageField):
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            return super().to_internal_value(base64_data)
+        if ';base64,' in base64_data:
+            base64_data = base64_data.split(';base64,', 1)[1]
+        file = TemporaryUploadedFile('upload', None, 0, None)
+        try:
+            # Кусок декодируется только целыми группами по 4 символа,
+            # остаток переносится в следующий.
+            rest = ''
+            for start in range(0, len(base64_data), CHUNK_SIZE):
+                chunk = rest + NOT_BASE64.sub(
+                    '', base64_data[start:start + CHUNK_SIZE])
+                end = len(chunk) - len(chunk) % 4
+                file.write(base64.b64decode(chunk[:end]))
+                rest = chunk[end:]
+            file.write(base64.b64decode(rest))
+        except (TypeError, binascii.Error, ValueError):
+            file.close()
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        file.size = file.tell()
+        file.seek(0)
+        try:
+            with Image.open(file.temporary_file_path()) as image:
+                extension = (image.format or '').lower()
+        except (OSError, SyntaxError):
+            file.close()
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        extension = 'jpg' if extension == 'jpeg' else extension
+        if extension not in self.ALLOWED_TYPES:
+            file.close()
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        file.name = f'{uuid.uuid4()}.{extension}'
+        return super(Base64FieldMixin, self).to_internal_value(file)
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    def to_representation(self, renditions):
+        request = self.context.get('request')
+        result = {}
+        for size, formats in renditions.items():
+            result[size] = {}
+            for image_format, name in formats.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                result[size][image_format] = url
+        return result
+
+
+def get_formats():
+    return [
+        image_format for image_format in settings.RECIPE_IMAGE_FORMATS
+        if image_format != 'webp' or features.check('webp')
+    ]
+
+
+def make_renditions(recipe_id, image_name):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    renditions = {}
+    with default_storage.open(image_name) as file, \
+            Image.open(file) as original:
+        original = original.convert('RGB')
+        for size, max_side in settings.RECIPE_IMAGE_RENDITIONS.items():
+            image = original.copy()
+            image.thumbnail((max_side, max_side))
+            renditions[size] = {}
+            for image_format in get_formats():
+                buffer = io.BytesIO()
+                image.save(buffer, PIL_FORMATS[image_format], quality=80)
+                name = f'{RENDITIONS_DIR}/{stem}_{size}.{image_format}'
+                default_storage.delete(name)
+                renditions[size][image_format] = default_storage.save(
+                    name, ContentFile(buffer.getvalue())
+                )
+    Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_renditions=renditions)
+    invalidate_recipes([recipe_id])
+    return renditions
+
+
+def process_image(recipe_id, image_name):
+    try:
+        make_renditions(recipe_id, image_name)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', image_name)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe, upload):
+    upload.close()
+    args = (recipe.pk, recipe.image.name)
+    if settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(lambda: executor.submit(process_image, *args))
+    else:
+        transaction.on_commit(lambda: make_renditions(*args))
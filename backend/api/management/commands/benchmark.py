@@ -0,0 +1,318 @@
+import json
+import math
+import random
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+
+from api.autocomplete import ingredient_index
+from api.cache import bump_version
+from api.counters import recount
+from api.metrics import QueryCollector
+from api.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
+                        ShoppingCart, Tag, TagQuantity)
+from api.shopping_list import rebuild_shopping_lists
+from api.units import UNITS
+from users.models import Follow, User
+
+WORDS = (
+    'молоко', 'мука', 'масло', 'сахар', 'соль',
+    'сыр', 'яйцо', 'перец', 'лук', 'томат',
+)
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    index = max(math.ceil(percent / 100 * len(values)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными и замеряет время ответа '
+        'основных эндпоинтов API. Данные откатываются после замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument(
+            '--recipes', type=int, default=10,
+            help='Рецептов у каждого пользователя'
+        )
+        parser.add_argument('--ingredients', type=int, default=1000)
+        parser.add_argument(
+            '--per-recipe', type=int, default=8,
+            help='Ингредиентов в одном рецепте'
+        )
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Подписок у каждого пользователя'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Рецептов в избранном у каждого пользователя'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Рецептов в корзине у каждого пользователя'
+        )
+        parser.add_argument('--tags', type=int, default=5)
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Запросов на каждый сценарий'
+        )
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--output', default='benchmark.json',
+            help='Файл для результатов в JSON, "-" для вывода в консоль'
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Не откатывать созданные данные'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['recipes'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь и рецепт.')
+        if options['requests'] < 1:
+            raise CommandError('Нужен хотя бы один запрос на сценарий.')
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.prefix = uuid.uuid4().hex[:8]
+        setup_test_environment()
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                self.seed()
+                seed_seconds = time.perf_counter() - started
+                self.stdout.write(
+                    f'Данные созданы за {seed_seconds:.2f} с.')
+                scenarios = self.run()
+                transaction.set_rollback(not options['keep'])
+        finally:
+            teardown_test_environment()
+            self.reset_caches()
+        result = {
+            'database': connection.vendor,
+            'scale': {
+                name: options[name] for name in (
+                    'users', 'recipes', 'ingredients', 'per_recipe',
+                    'follows', 'favorites', 'carts', 'tags'
+                )
+            },
+            'requests': options['requests'],
+            'seed': options['seed'],
+            'seed_seconds': round(seed_seconds, 3),
+            'scenarios': scenarios,
+        }
+        self.report(scenarios)
+        if options['output'] == '-':
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(result, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Результаты записаны в {options["output"]}.'))
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(
+            objects, batch_size=self.options['batch_size'])
+
+    def sample(self, population, size):
+        return self.random.sample(population, min(size, len(population)))
+
+    def seed(self):
+        options = self.options
+        prefix = self.prefix
+        password = make_password(None)
+        self.bulk_create(User, (
+            User(
+                username=f'{prefix}-{i}', email=f'{prefix}-{i}@example.com',
+                first_name='Тест', last_name=str(i), password=password
+            )
+            for i in range(options['users'])
+        ))
+        users = list(User.objects.filter(
+            username__startswith=f'{prefix}-').values_list('id', flat=True))
+        self.bulk_create(Token, (
+            Token(key=Token.generate_key(), user_id=user_id)
+            for user_id in users
+        ))
+        self.bulk_create(Tag, (
+            Tag(
+                name=f'{prefix}-{i}', slug=f'{prefix}-{i}',
+                color=f'#{prefix[:2]}{i:04x}'
+            )
+            for i in range(options['tags'])
+        ))
+        tags = list(Tag.objects.filter(
+            slug__startswith=f'{prefix}-').values_list('id', 'slug'))
+        units = list(UNITS)
+        self.bulk_create(Ingredient, (
+            Ingredient(
+                name=f'{WORDS[i % len(WORDS)]} {prefix}-{i}',
+                measurement_unit=units[i % len(units)]
+            )
+            for i in range(options['ingredients'])
+        ))
+        ingredients = list(Ingredient.objects.filter(
+            name__contains=f' {prefix}-').values_list('id', flat=True))
+        self.bulk_create(Recipe, (
+            Recipe(
+                author_id=user_id, name=f'Рецепт {prefix}-{i}',
+                text='Синтетический рецепт', cooking_time=i % 120 + 1,
+                image=f'recipes/image/{prefix}.png'
+            )
+            for user_id in users for i in range(options['recipes'])
+        ))
+        recipes = list(Recipe.objects.filter(
+            author_id__in=users).values_list('id', flat=True))
+        self.bulk_create(TagQuantity, (
+            TagQuantity(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipes
+            for tag_id, _ in self.sample(tags, 2)
+        ))
+        self.bulk_create(IngredientQuantity, (
+            IngredientQuantity(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=self.random.randint(1, 500)
+            )
+            for recipe_id in recipes
+            for ingredient_id in self.sample(
+                ingredients, options['per_recipe'])
+        ))
+        self.bulk_create(Follow, (
+            Follow(user_id=user_id, following_id=following_id)
+            for user_id in users
+            for following_id in self.sample(
+                [other for other in users if other != user_id],
+                options['follows'])
+        ))
+        # Первый пользователь делает запросы, и у него должны остаться
+        # рецепты, которые можно добавить в избранное.
+        favorites = {
+            user_id: self.sample(recipes, options['favorites'])
+            for user_id in users
+        }
+        favorites[users[0]] = favorites[users[0]][:len(recipes) - 1]
+        self.bulk_create(Favorite, (
+            Favorite(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_ids in favorites.items()
+            for recipe_id in recipe_ids
+        ))
+        self.bulk_create(ShoppingCart, (
+            ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+            for user_id in users
+            for recipe_id in self.sample(recipes, options['carts'])
+        ))
+        # bulk_create не отправляет сигналы, поэтому счетчики и списки
+        # покупок пересчитываются отдельно.
+        recount(Recipe.objects.filter(pk__in=recipes))
+        rebuild_shopping_lists(users)
+        self.reset_caches()
+        self.user = User.objects.get(pk=users[0])
+        self.tags = [slug for _, slug in tags]
+        self.ingredients = ingredients
+        self.recipes = sorted(set(recipes) - set(favorites[users[0]]))
+
+    def reset_caches(self):
+        ingredient_index.invalidate()
+        bump_version('ingredients')
+        bump_version('tags')
+
+    def get_scenarios(self):
+        tags = self.tags or ['']
+        recipes = self.recipes
+        return (
+            ('recipes', 'get', lambda i: '/api/recipes/?limit=6'),
+            ('recipes_filtered', 'get', lambda i: (
+                f'/api/recipes/?limit=6&tags={tags[i % len(tags)]}'
+                f'&ordering=popular'
+            )),
+            ('ingredients_search', 'get', lambda i: (
+                f'/api/ingredients/?name={WORDS[i % len(WORDS)][:2]}'
+            )),
+            ('feed', 'get', lambda i: '/api/recipes/feed/?limit=6'),
+            ('recipes_match', 'get', lambda i: (
+                '/api/recipes/match/?ingredients=' + ','.join(
+                    map(str, self.ingredients[i:i + 10]))
+            )),
+            ('subscriptions', 'get', lambda i: (
+                '/api/users/subscriptions/?recipes_limit=3'
+            )),
+            ('favorite_add', 'post', lambda i: (
+                f'/api/recipes/{recipes[i % len(recipes)]}/favorite/'
+            )),
+            ('favorite_remove', 'delete', lambda i: (
+                f'/api/recipes/{recipes[i % len(recipes)]}/favorite/'
+            )),
+            ('download_cart', 'get', lambda i: (
+                '/api/recipes/download_shopping_cart/'
+            )),
+        )
+
+    def request(self, client, method, path):
+        collector = QueryCollector()
+        started = time.perf_counter()
+        with connection.execute_wrapper(collector):
+            response = getattr(client, method)(path)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+        return (
+            time.perf_counter() - started, collector.queries,
+            response.status_code
+        )
+
+    def run(self):
+        token = Token.objects.get(user=self.user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        scenarios = self.get_scenarios()
+        for i in range(self.options['warmup']):
+            for _, method, path in scenarios:
+                self.request(client, method, path(i))
+        samples = {name: [] for name, _, _ in scenarios}
+        for i in range(self.options['requests']):
+            for name, method, path in scenarios:
+                samples[name].append(self.request(client, method, path(i)))
+        return {
+            name: self.summarize(samples[name]) for name in samples
+        }
+
+    def summarize(self, samples):
+        seconds = sorted(sample[0] for sample in samples)
+        queries = [sample[1] for sample in samples]
+        total = sum(seconds)
+        result = {
+            f'p{percent}_ms': round(percentile(seconds, percent) * 1000, 3)
+            for percent in PERCENTILES
+        }
+        result.update({
+            'requests': len(samples),
+            'errors': sum(sample[2] >= 400 for sample in samples),
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+            'rps': round(len(samples) / total, 1) if total else None,
+        })
+        return result
+
+    def report(self, scenarios):
+        self.stdout.write(
+            f'{"сценарий":<20}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"запросы":>9}{"rps":>9}{"ошибки":>8}'
+        )
+        for name, result in scenarios.items():
+            self.stdout.write(
+                f'{name:<20}{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}'
+                f'{result["p99_ms"]:>9.2f}{result["queries_mean"]:>9.1f}'
+                f'{result["rps"] or 0:>9.1f}{result["errors"]:>8}'
+            )
@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from api.images import make_renditions
+from api.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создает уменьшенные копии картинок рецептов, у которых их нет.'
+
+    def handle(self, *args, **kwargs):
+        recipes = Recipe.objects.filter(image_renditions={}).values_list(
+            'id', 'image')
+        count = 0
+        for recipe_id, image_name in recipes.iterator():
+            make_renditions(recipe_id, image_name)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {count}.'))
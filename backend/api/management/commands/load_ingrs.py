@@ -1,24 +1,116 @@
 import csv
+import json
+import os
+import time
 
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
 from api.models import Ingredient
 
 
+def read_csv(file):
+    for row in csv.reader(file, delimiter=','):
+        if row:
+            yield row[0], row[1]
+
+
+def read_json(file, chunk_size=64 * 1024):
+    # Массив читается кусками, в памяти держится только непрочитанный
+    # остаток текущего куска.
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        while position < len(buffer) and (
+                buffer[position].isspace() or buffer[position] == ','):
+            position += 1
+        if position < len(buffer) and not started:
+            if buffer[position] != '[':
+                raise CommandError('Ожидается JSON-массив ингредиентов.')
+            started = True
+            position += 1
+            continue
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise CommandError('Файл JSON поврежден или обрезан.')
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        position = end
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
 class Command(BaseCommand):
-    help = 'Add csv files to Django Models.'
-
-    def handle(self, *args, **kwargs):
-        data_path = settings.BASE_DIR
-        with open(
-            f'{ data_path }/data/ingredients.csv',
-            newline='',
-            encoding='utf-8'
-        ) as file:
-            spamreader = csv.reader(file, delimiter=',')
-            for row in spamreader:
-                Ingredient.objects.update_or_create(name=row[0],
-                                                    measurement_unit=row[1])
-            self.stdout.write(self.style.SUCCESS(
-                              'Все ингредиенты загружены.'))
+    help = 'Загружает ингредиенты из CSV или JSON файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+            help='Путь к файлу .csv или .json'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT'
+        )
+
+    def handle(self, *args, path, batch_size, verbosity, **kwargs):
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json')
+        started = time.monotonic()
+        total = 0
+        with open(path, newline='', encoding='utf-8') as file, \
+                transaction.atomic():
+            before = Ingredient.objects.count()
+            existing = set(
+                Ingredient.objects.values_list('name', 'measurement_unit')
+            )
+            batch = []
+            for row in reader(file):
+                total += 1
+                if row in existing:
+                    continue
+                existing.add(row)
+                batch.append(Ingredient(name=row[0], measurement_unit=row[1]))
+                if len(batch) >= batch_size:
+                    self.flush(batch, batch_size)
+                    if verbosity > 1:
+                        self.report(
+                            total, Ingredient.objects.count() - before,
+                            started
+                        )
+            self.flush(batch, batch_size)
+            # ignore_conflicts молча пропускает строки, которые успел
+            # добавить кто-то другой, поэтому считаются строки в таблице.
+            created = Ingredient.objects.count() - before
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Все ингредиенты загружены: прочитано {total}, '
+            f'добавлено {created} за {elapsed:.2f} с '
+            f'({total / elapsed:.0f} строк/с).'
+        ))
+
+    def flush(self, batch, batch_size):
+        Ingredient.objects.bulk_create(
+            batch, batch_size=batch_size, ignore_conflicts=True
+        )
+        batch.clear()
+
+    def report(self, total, created, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f'Прочитано {total}, добавлено {created} '
+            f'({total / elapsed:.0f} строк/с)'
+        )
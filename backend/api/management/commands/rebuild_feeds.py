@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+from api.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ящики ленты подписок из подписок и рецептов.'
+
+    def handle(self, *args, **kwargs):
+        created = rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны, записей: {created}.'))
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from api.models import Recipe
+from api.search import update_search_vector
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковые векторы рецептов (только PostgreSQL).'
+
+    def handle(self, *args, **kwargs):
+        updated = update_search_vector(Recipe.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковые векторы обновлены у {updated} рецептов.'))
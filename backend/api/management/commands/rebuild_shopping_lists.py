@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+from api.shopping_list import rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает списки покупок пользователей из их корзин.'
+
+    def handle(self, *args, **kwargs):
+        created = rebuild_shopping_lists()
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны, позиций: {created}.'))
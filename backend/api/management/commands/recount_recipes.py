@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from api.counters import recount
+from api.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики избранного и корзин у рецептов.'
+
+    def handle(self, *args, **kwargs):
+        updated = recount(Recipe.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны у {updated} рецептов.'))
@@ -0,0 +1,122 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from .cache import bump_version, get_version
+from .models import IngredientQuantity
+
+VERSION_NAME = 'recipe_ingredients'
+
+
+# Обратный индекс: ингредиент -> отсортированный массив id рецептов.
+class RecipeIngredientIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+
+    def build(self):
+        postings = defaultdict(lambda: array('q'))
+        recipes = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientQuantity.objects.order_by(
+                'recipe_id').values_list('recipe_id', 'ingredient_id'):
+            postings[ingredient_id].append(recipe_id)
+            recipes[recipe_id].append(ingredient_id)
+        return dict(postings), {
+            recipe_id: tuple(ingredients)
+            for recipe_id, ingredients in recipes.items()
+        }
+
+    def is_fresh(self, data, version):
+        # Версия хранится в кэше процесса, поэтому изменения из других
+        # воркеров попадают в индекс только после его пересборки.
+        return data is not None and data[0] == version and (
+            time.monotonic() - data[1] < settings.RECIPE_MATCH_INDEX_TIMEOUT
+        )
+
+    def load(self):
+        version = get_version(VERSION_NAME)
+        data = self._data
+        if not self.is_fresh(data, version):
+            with self._lock:
+                if not self.is_fresh(self._data, version):
+                    self._data = (version, time.monotonic(), *self.build())
+                data = self._data
+        return data
+
+    def invalidate(self):
+        self._data = None
+
+    def refresh(self, recipe_ids):
+        rows = IngredientQuantity.objects.filter(
+            recipe_id__in=recipe_ids).values_list('recipe_id', 'ingredient_id')
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in rows:
+            ingredients[recipe_id].append(ingredient_id)
+        version = get_version(VERSION_NAME)
+        new_version = bump_version(VERSION_NAME)
+        with self._lock:
+            # Если индекс уже устарел из-за записи в другом процессе,
+            # его дешевле пересобрать целиком при следующем поиске.
+            if self._data is None or self._data[0] != version:
+                self._data = None
+                return
+            # Поиск мог уже взять старый снимок, поэтому оба словаря
+            # копируются, а не меняются на месте.
+            _, built, postings, recipes = self._data
+            postings, recipes = dict(postings), dict(recipes)
+            for recipe_id in recipe_ids:
+                for ingredient_id in recipes.pop(recipe_id, ()):
+                    ids = postings[ingredient_id] = array(
+                        'q', postings[ingredient_id])
+                    index = bisect_left(ids, recipe_id)
+                    if index < len(ids) and ids[index] == recipe_id:
+                        del ids[index]
+                for ingredient_id in ingredients.get(recipe_id, ()):
+                    ids = postings[ingredient_id] = array(
+                        'q', postings.get(ingredient_id, ()))
+                    insort(ids, recipe_id)
+                if recipe_id in ingredients:
+                    recipes[recipe_id] = tuple(ingredients[recipe_id])
+            self._data = (new_version, built, postings, recipes)
+
+    def match(self, ingredient_ids):
+        _, _, postings, recipes = self.load()
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(postings.get(ingredient_id, ()))
+        return sorted(
+            (
+                (recipe_id, count, len(recipes[recipe_id]))
+                for recipe_id, count in matched.items()
+            ),
+            key=lambda row: (row[1] / row[2], row[1], row[0]),
+            reverse=True
+        )
+
+
+recipe_index = RecipeIngredientIndex()
+
+
+def match_recipes_sql(ingredient_ids):
+    return IngredientQuantity.objects.filter(
+        recipe__in=IngredientQuantity.objects.filter(
+            ingredient__in=ingredient_ids).values('recipe')
+    ).values('recipe').annotate(
+        total=Count('pk'),
+        matched=Count('pk', filter=Q(ingredient__in=ingredient_ids)),
+    ).annotate(
+        coverage=Cast('matched', FloatField()) / F('total')
+    ).order_by('-coverage', '-matched', '-recipe').values_list(
+        'recipe', 'matched', 'total')
+
+
+def match_recipes(ingredient_ids):
+    if settings.RECIPE_MATCH_BACKEND == 'sql':
+        return match_recipes_sql(ingredient_ids)
+    return recipe_index.match(ingredient_ids)
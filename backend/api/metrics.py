@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERIES_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+METRICS = {
+    'queries': ('foodgram_request_queries', QUERIES_BUCKETS),
+    'db_seconds': ('foodgram_request_db_seconds', SECONDS_BUCKETS),
+    'app_seconds': ('foodgram_request_app_seconds', SECONDS_BUCKETS),
+    'seconds': ('foodgram_request_seconds', SECONDS_BUCKETS),
+}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, values):
+        with self._lock:
+            histograms = self._views.get(view)
+            if histograms is None:
+                histograms = self._views[view] = {
+                    name: Histogram(buckets)
+                    for name, (_, buckets) in METRICS.items()
+                }
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (metric, buckets) in METRICS.items():
+                lines.append(f'# TYPE {metric} histogram')
+                for view, histograms in sorted(self._views.items()):
+                    histogram = histograms[name]
+                    cumulative = 0
+                    for bound, count in zip(
+                            (*buckets, '+Inf'), histogram.counts):
+                        cumulative += count
+                        lines.append(
+                            f'{metric}_bucket{{view="{view}",le="{bound}"}} '
+                            f'{cumulative}'
+                        )
+                    lines.append(
+                        f'{metric}_sum{{view="{view}"}} {histogram.sum}')
+                    lines.append(
+                        f'{metric}_count{{view="{view}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = Registry()
+
+
+class QueryCollector:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+def get_view_name(view_func, request):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__qualname__', repr(view_func))
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def record(view, collector, started, strict=True):
+    seconds = time.perf_counter() - started
+    registry.observe(view, {
+        'queries': collector.queries,
+        'db_seconds': collector.db_seconds,
+        'app_seconds': max(seconds - collector.db_seconds, 0),
+        'seconds': seconds,
+    })
+    budget = settings.QUERY_BUDGETS.get(view)
+    if budget is not None and collector.queries > budget:
+        message = (
+            f'{view}: {collector.queries} SQL-запросов при бюджете {budget}'
+        )
+        if strict and settings.QUERY_BUDGETS_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
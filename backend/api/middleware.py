@@ -0,0 +1,35 @@
+import time
+
+from django.db import connection
+
+from .metrics import QueryCollector, get_view_name, record
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        started = time.perf_counter()
+        with connection.execute_wrapper(collector):
+            response = self.get_response(request)
+        view = getattr(request, 'metrics_view', None)
+        if view is None:
+            return response
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, view, collector, started)
+        else:
+            record(view, collector, started)
+        return response
+
+    def stream(self, content, view, collector, started):
+        with connection.execute_wrapper(collector):
+            yield from content
+        # Часть ответа уже отправлена, исключение лишь оборвало бы
+        # загрузку, поэтому превышение бюджета только пишется в лог.
+        record(view, collector, started, strict=False)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = get_view_name(view_func, request)
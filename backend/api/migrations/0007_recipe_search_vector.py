@@ -0,0 +1,50 @@
+# Generated by Django 3.2.6 on 2026-10-18 18:57
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# GIN-индекс и тип tsvector есть только в PostgreSQL, на остальных базах
+# поле остается пустым, а поиск идет без индекса.
+CREATE_INDEX = '''
+CREATE INDEX recipe_search_idx ON api_recipe USING GIN (search_vector)
+'''
+DROP_INDEX = 'DROP INDEX IF EXISTS recipe_search_idx'
+FILL_SEARCH_VECTOR = '''
+UPDATE api_recipe SET search_vector =
+    setweight(to_tsvector('russian', coalesce(name, '')), 'A')
+    || setweight(to_tsvector('russian', coalesce(text, '')), 'B')
+    || setweight(to_tsvector('russian', coalesce((
+        SELECT string_agg(ingredient.name, ' ')
+        FROM api_ingredientquantity AS quantity
+        JOIN api_ingredient AS ingredient
+            ON ingredient.id = quantity.ingredient_id
+        WHERE quantity.recipe_id = api_recipe.id
+    ), '')), 'C')
+'''
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+        schema_editor.execute(FILL_SEARCH_VECTOR)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_shopping_list_item'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
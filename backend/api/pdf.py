@@ -0,0 +1,73 @@
+import hashlib
+import io
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+FONT_NAME = 'FreeSans'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'data', 'FreeSans.ttf')
+CACHE_KEY_PREFIX = 'shopping_cart_pdf'
+CHUNK_SIZE = 8192
+
+
+def register_font():
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def render_shopping_cart(buffer, ingredients):
+    begin_position_x, begin_position_y = 40, 650
+    sheet = canvas.Canvas(buffer, pagesize=A4)
+    sheet.setFont(FONT_NAME, 50)
+    sheet.setTitle('Список покупок')
+    sheet.drawString(begin_position_x,
+                     begin_position_y + 40, 'Список покупок: ')
+    sheet.setFont(FONT_NAME, 24)
+    for number, item in enumerate(ingredients, start=1):
+        if begin_position_y < 100:
+            begin_position_y = 700
+            sheet.showPage()
+            sheet.setFont(FONT_NAME, 24)
+        sheet.drawString(
+            begin_position_x,
+            begin_position_y,
+            f'{number}.  {item["ingredient__name"]} - '
+            f'{item["ingredient_total"]}'
+            f' {item["ingredient__measurement_unit"]}'
+        )
+        begin_position_y -= 30
+    sheet.showPage()
+    sheet.save()
+
+
+def get_cache_key(ingredients):
+    digest = hashlib.sha256()
+    for item in ingredients:
+        digest.update(repr((
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['ingredient_total'],
+        )).encode())
+    return f'{CACHE_KEY_PREFIX}:{digest.hexdigest()}'
+
+
+def get_shopping_cart_pdf(ingredients):
+    ingredients = list(ingredients)
+    key = get_cache_key(ingredients)
+    document = cache.get(key)
+    if document is None:
+        buffer = io.BytesIO()
+        render_shopping_cart(buffer, ingredients)
+        document = buffer.getvalue()
+        cache.set(key, document, settings.SHOPPING_CART_CACHE_TIMEOUT)
+    return document
+
+
+def iter_chunks(document, chunk_size=CHUNK_SIZE):
+    for start in range(0, len(document), chunk_size):
+        yield document[start:start + chunk_size]
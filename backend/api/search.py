@@ -0,0 +1,58 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections
+from django.db.models import (Case, Exists, F, IntegerField, OuterRef, Q,
+                              Subquery, Value, When)
+
+from .models import IngredientQuantity, Recipe
+
+SEARCH_CONFIG = 'russian'
+
+
+def is_postgresql(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def ingredient_names():
+    return Subquery(
+        IngredientQuantity.objects.filter(recipe=OuterRef('pk')).order_by(
+        ).values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')).values('names')
+    )
+
+
+def update_search_vector(recipes):
+    if not is_postgresql(recipes):
+        return 0
+    return recipes.update(search_vector=(
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(ingredient_names(), weight='C', config=SEARCH_CONFIG)
+    ))
+
+
+def search_recipes(queryset, value):
+    if is_postgresql(queryset):
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch')
+        rank = SearchRank(F('search_vector'), query)
+        queryset = queryset.filter(search_vector=query)
+    else:
+        # Запасной вариант для SQLite: без индекса, подходит для
+        # разработки и тестов на небольших данных.
+        rank = Value(0, output_field=IntegerField())
+        for term in value.split():
+            queryset = queryset.filter(
+                Exists(IngredientQuantity.objects.filter(
+                    recipe=OuterRef('pk'), ingredient__name__icontains=term))
+                | Q(name__icontains=term) | Q(text__icontains=term)
+            )
+            rank = rank + Case(
+                When(name__icontains=term, then=Value(3)),
+                When(text__icontains=term, then=Value(2)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+    return queryset.annotate(rank=rank).order_by(
+        '-rank', *Recipe._meta.ordering)
@@ -1,8 +1,17 @@
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from api.cache import invalidate_recipes
+from api.images import (ChunkedBase64ImageField, ImageRenditionsField,
+                        schedule_renditions)
+from api.matching import recipe_index
 from api.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
                         ShoppingCart, Tag, TagQuantity)
+from api.search import update_search_vector
+from api.shopping_list import change_recipe_in_shopping_lists
+from api.signals import skip_row_receivers
 from users.serializers import CustomUserSerializer
 
 
@@ -48,15 +57,24 @@ class RecipeListSerializer(serializers.ModelSerializer):
         many=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_renditions',
+            'text', 'cooking_time', 'favorites_count', 'carts_count'
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -67,6 +85,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
             return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -77,6 +97,18 @@ class RecipeListSerializer(serializers.ModelSerializer):
             return False
 
 
+class RecipeMatchSerializer(RecipeListSerializer):
+    matched = serializers.IntegerField(read_only=True)
+    coverage = serializers.FloatField(read_only=True)
+    missing = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + (
+            'matched', 'coverage', 'missing'
+        )
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
     tags = serializers.PrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True
@@ -85,7 +117,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         source='ingredientrecipes', many=True
     )
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = ChunkedBase64ImageField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -101,31 +133,36 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({
                 'ingredients': 'Нужно выбрать хотя бы один ингредиент!'
             })
-        ingredients_list = []
+        ingredient_ids = {
+            ingredient['ingredient']['id'] for ingredient in ingredients
+        }
+        if len(ingredient_ids) != len(ingredients):
+            raise serializers.ValidationError({
+                'ingredients': 'Ингредиенты должны быть уникальными!'
+            })
         for ingredient in ingredients:
-            ingredient_id = ingredient['ingredient']['id']
-            if ingredient_id in ingredients_list:
-                raise serializers.ValidationError({
-                    'ingredients': 'Ингредиенты должны быть уникальными!'
-                })
-            ingredients_list.append(ingredient_id)
-            amount = ingredient['amount']
-            if int(amount) <= 0:
+            if int(ingredient['amount']) <= 0:
                 raise serializers.ValidationError({
                     'amount': 'Количество ингредиента должно быть больше нуля!'
                 })
+        found = Ingredient.objects.in_bulk(ingredient_ids)
+        missing = ingredient_ids - found.keys()
+        if missing:
+            raise serializers.ValidationError({
+                'ingredients': 'Ингредиенты не найдены: {}'.format(
+                    ', '.join(map(str, sorted(missing))))
+            })
+        for ingredient in ingredients:
+            ingredient['ingredient'] = found[ingredient['ingredient']['id']]
         tags = value['tags']
         if not tags:
             raise serializers.ValidationError({
                 'tags': 'Нужно выбрать хотя бы один тэг!'
             })
-        tags_list = []
-        for tag in tags:
-            if tag in tags_list:
-                raise serializers.ValidationError({
-                    'tags': 'Тэги должны быть уникальными!'
-                })
-            tags_list.append(tag)
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError({
+                'tags': 'Тэги должны быть уникальными!'
+            })
         cooking_time = value['cooking_time']
         if int(cooking_time) <= 0:
             raise serializers.ValidationError({
@@ -133,48 +170,88 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             })
         return value
 
-    def add_tags_and_ingredients(self, tags, ingredients, recipe):
-        for tag_data in tags:
-            recipe.tags.add(tag_data)
-            recipe.save()
-        ingred = [
-            IngredientQuantity(ingredient_id=ingredient['ingredient']['id'],
-                               amount=ingredient['amount'],
-                               recipe=recipe)
-            for ingredient in ingredients
-        ]
-        IngredientQuantity.objects.bulk_create(ingred)
-        return recipe
+    def set_tags(self, recipe, tags, existing=()):
+        existing = set(existing)
+        new = {tag.id for tag in tags}
+        TagQuantity.objects.bulk_create(
+            TagQuantity(tag_id=tag_id, recipe=recipe)
+            for tag_id in new - existing
+        )
+        if existing - new:
+            TagQuantity.objects.filter(
+                recipe=recipe, tag_id__in=existing - new).delete()
+
+    def set_ingredients(self, recipe, ingredients, existing=()):
+        existing = {row.ingredient_id: row for row in existing}
+        to_create, to_update, deltas = [], [], {}
+        for ingredient in ingredients:
+            amount = ingredient['amount']
+            row = existing.pop(ingredient['ingredient'].id, None)
+            if row is None:
+                to_create.append(IngredientQuantity(
+                    ingredient=ingredient['ingredient'], amount=amount,
+                    recipe=recipe
+                ))
+                deltas[ingredient['ingredient'].id] = amount
+            elif row.amount != amount:
+                deltas[row.ingredient_id] = amount - row.amount
+                row.amount = amount
+                to_update.append(row)
+        IngredientQuantity.objects.bulk_create(to_create)
+        if to_update:
+            IngredientQuantity.objects.bulk_update(to_update, ['amount'])
+        if existing:
+            with skip_row_receivers():
+                IngredientQuantity.objects.filter(
+                    pk__in=[row.pk for row in existing.values()]).delete()
+        for row in existing.values():
+            deltas[row.ingredient_id] = -row.amount
+        return deltas
 
+    @transaction.atomic
     def create(self, validated_data):
-        author = validated_data.get('author')
         tags = validated_data.pop('tags')
-        name = validated_data.get('name')
-        image = validated_data.get('image')
-        text = validated_data.get('text')
-        cooking_time = validated_data.get('cooking_time')
         ingredients = validated_data.pop('ingredientrecipes')
-        recipes = Recipe.objects.create(
-            author=author,
-            name=name,
-            image=image,
-            text=text,
-            cooking_time=cooking_time,
-        )
-        self.add_tags_and_ingredients(tags, ingredients, recipes)
-        return recipes
+        recipe = Recipe.objects.create(**validated_data)
+        self.set_tags(recipe, tags)
+        self.set_ingredients(recipe, ingredients)
+        update_search_vector(Recipe.objects.filter(pk=recipe.pk))
+        transaction.on_commit(lambda: recipe_index.refresh([recipe.pk]))
+        schedule_renditions(recipe, validated_data['image'])
+        return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredientrecipes')
-        TagQuantity.objects.filter(recipe=instance).delete()
-        IngredientQuantity.objects.filter(recipe=instance).delete()
-        instance = self.add_tags_and_ingredients(
-            tags, ingredients, instance)
-        super().update(instance, validated_data)
-        instance.save()
+        self.set_tags(instance, tags, TagQuantity.objects.filter(
+            recipe=instance).values_list('tag_id', flat=True))
+        deltas = self.set_ingredients(
+            instance, ingredients,
+            IngredientQuantity.objects.filter(recipe=instance)
+        )
+        change_recipe_in_shopping_lists(instance, deltas)
+        if any(deltas.values()):
+            transaction.on_commit(
+                lambda: recipe_index.refresh([instance.pk]))
+        if 'image' in validated_data:
+            validated_data['image_renditions'] = {}
+        instance = super().update(instance, validated_data)
+        invalidate_recipes([instance.pk])
+        if 'image' in validated_data:
+            schedule_renditions(instance, validated_data['image'])
         return instance
 
+    def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], 'tags', Prefetch(
+                'ingredientrecipes',
+                queryset=IngredientQuantity.objects.select_related(
+                    'ingredient')
+            )
+        )
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
         request = self.context.get('request')
         if request.user.is_anonymous:
@@ -197,9 +274,11 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
 
 class RecipeRepresentationSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class FavoriteSerializer(serializers.Serializer):
@@ -209,6 +288,14 @@ class FavoriteSerializer(serializers.Serializer):
     image = Base64ImageField(max_length=None, use_url=False,)
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+
+
 class ShoppingCartSerializer(serializers.Serializer):
     id = serializers.IntegerField()
     name = serializers.CharField()
@@ -0,0 +1,89 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import IngredientQuantity, ShoppingCart, ShoppingListItem
+
+
+def get_recipe_amounts(recipe_ids):
+    amounts = Counter()
+    for ingredient_id, amount in IngredientQuantity.objects.filter(
+            recipe_id__in=recipe_ids).values_list('ingredient_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return amounts
+
+
+def change_shopping_lists(user_ids, deltas):
+    deltas = {key: value for key, value in deltas.items() if value}
+    user_ids = set(user_ids)
+    if not user_ids or not deltas:
+        return
+    with transaction.atomic():
+        existing = {
+            (item.user_id, item.ingredient_id): item
+            for item in ShoppingListItem.objects.select_for_update().filter(
+                user_id__in=user_ids, ingredient_id__in=deltas)
+        }
+        to_create, to_update, to_delete = [], [], []
+        for user_id in user_ids:
+            for ingredient_id, delta in deltas.items():
+                item = existing.get((user_id, ingredient_id))
+                if item is None:
+                    if delta > 0:
+                        to_create.append(ShoppingListItem(
+                            user_id=user_id, ingredient_id=ingredient_id,
+                            amount=delta
+                        ))
+                    continue
+                item.amount += delta
+                if item.amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.pk)
+        ShoppingListItem.objects.bulk_create(to_create)
+        if to_update:
+            ShoppingListItem.objects.bulk_update(to_update, ['amount'])
+        if to_delete:
+            ShoppingListItem.objects.filter(pk__in=to_delete).delete()
+
+
+def add_recipes_to_shopping_list(user_id, recipe_ids):
+    change_shopping_lists([user_id], get_recipe_amounts(recipe_ids))
+
+
+def remove_recipes_from_shopping_list(user_id, recipe_ids):
+    change_shopping_lists([user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in get_recipe_amounts(recipe_ids).items()
+    })
+
+
+def change_recipe_in_shopping_lists(recipe, deltas):
+    if any(deltas.values()):
+        change_shopping_lists(
+            ShoppingCart.objects.filter(recipe=recipe).values_list(
+                'user_id', flat=True),
+            deltas
+        )
+
+
+@transaction.atomic
+def rebuild_shopping_lists(user_ids=None):
+    items = ShoppingListItem.objects.all()
+    totals = IngredientQuantity.objects.filter(recipe__carts__isnull=False)
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        totals = IngredientQuantity.objects.filter(
+            recipe__carts__user_id__in=user_ids)
+    items.delete()
+    totals = totals.values('recipe__carts__user', 'ingredient').order_by(
+    ).annotate(total=Sum('amount'))
+    return len(ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=row['recipe__carts__user'],
+            ingredient_id=row['ingredient'],
+            amount=row['total']
+        )
+        for row in totals
+    ))
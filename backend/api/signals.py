@@ -0,0 +1,187 @@
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from users.models import Follow, User
+from .autocomplete import ingredient_index
+from .cache import bump_version, invalidate_recipes
+from .counters import change_counter
+from .feed import (add_author_to_feed, add_recipe_to_feeds,
+                   remove_author_from_feed)
+from .matching import recipe_index
+from .models import (Favorite, Ingredient, IngredientQuantity, Recipe,
+                     ShoppingCart, Tag)
+from .search import update_search_vector
+from .shopping_list import (add_recipes_to_shopping_list,
+                            change_recipe_in_shopping_lists,
+                            remove_recipes_from_shopping_list)
+
+state = threading.local()
+
+
+@contextmanager
+def skip_row_receivers():
+    # Пакетные операции сами обновляют счетчики и списки покупок для
+    # всех строк сразу, обработчики отдельных строк на это время молчат.
+    previous = getattr(state, 'skip_rows', False)
+    state.skip_rows = True
+    try:
+        yield
+    finally:
+        state.skip_rows = previous
+
+
+def rows_skipped():
+    return getattr(state, 'skip_rows', False)
+
+
+def get_deleted_recipes():
+    if not hasattr(state, 'deleted_recipes'):
+        state.deleted_recipes = set()
+    return state.deleted_recipes
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+    bump_version('ingredients')
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vector(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(pre_delete, sender=Recipe)
+def mark_recipe_deleted(sender, instance, **kwargs):
+    get_deleted_recipes().add(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_index(sender, instance, **kwargs):
+    recipe_id = instance.pk
+    get_deleted_recipes().discard(recipe_id)
+    transaction.on_commit(lambda: recipe_index.refresh([recipe_id]))
+
+
+# RecipeWriteSerializer меняет строки ингредиентов пакетно и сам
+# обновляет списки покупок и индексы. Обработчики ниже нужны для
+# правок в админке и каскадного удаления ингредиента.
+@receiver(pre_save, sender=IngredientQuantity)
+def remember_ingredient_row(sender, instance, **kwargs):
+    instance.previous_row = None
+    if instance.pk and not rows_skipped():
+        instance.previous_row = IngredientQuantity.objects.filter(
+            pk=instance.pk).values_list(
+            'recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=IngredientQuantity)
+def change_ingredient_row(sender, instance, **kwargs):
+    if rows_skipped():
+        return
+    changes = defaultdict(Counter)
+    if getattr(instance, 'previous_row', None) is not None:
+        recipe_id, ingredient_id, amount = instance.previous_row
+        changes[recipe_id][ingredient_id] -= amount
+    changes[instance.recipe_id][instance.ingredient_id] += instance.amount
+    apply_ingredient_changes(changes)
+
+
+@receiver(post_delete, sender=IngredientQuantity)
+def remove_ingredient_row(sender, instance, **kwargs):
+    # При удалении рецепта список покупок уже уменьшил обработчик
+    # удаления корзин.
+    if rows_skipped() or instance.recipe_id in get_deleted_recipes():
+        return
+    apply_ingredient_changes({
+        instance.recipe_id: {instance.ingredient_id: -instance.amount}
+    })
+
+
+def apply_ingredient_changes(changes):
+    for recipe_id, deltas in changes.items():
+        change_recipe_in_shopping_lists(recipe_id, deltas)
+    recipe_ids = list(changes)
+    invalidate_recipes(recipe_ids)
+    update_search_vector(Recipe.objects.filter(pk__in=recipe_ids))
+    transaction.on_commit(lambda: recipe_index.refresh(recipe_ids))
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    bump_version('tags')
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created and not rows_skipped():
+        change_counter(sender, [instance.recipe_id], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    if not rows_skipped():
+        change_counter(sender, [instance.recipe_id], -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created and not rows_skipped():
+        add_recipes_to_shopping_list(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    # Ингредиенты рецепта удаляются каскадом раньше, чем приходит
+    # post_delete, поэтому список покупок пересчитывается до удаления.
+    if not rows_skipped():
+        remove_recipes_from_shopping_list(
+            instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created and settings.FEED_INBOX_ENABLED:
+        add_recipe_to_feeds(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, created, **kwargs):
+    # Новый рецепт получает ингредиенты после сохранения, его вектор
+    # обновляет RecipeWriteSerializer.create.
+    if not created:
+        update_search_vector(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+def fill_feed(sender, instance, created, **kwargs):
+    if created and settings.FEED_INBOX_ENABLED:
+        add_author_to_feed(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_feed(sender, instance, **kwargs):
+    if settings.FEED_INBOX_ENABLED:
+        remove_author_from_feed(instance.user_id, instance.following_id)
+
+
+# Теги рецепта меняет RecipeWriteSerializer, а удаление тега меняет
+# общую версию 'tags'.
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, **kwargs):
+    bump_version(f'user:{instance.pk}')
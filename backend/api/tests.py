@@ -0,0 +1,260 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
+                        ShoppingCart, ShoppingListItem, Tag, TagQuantity)
+from api.shopping_list import rebuild_shopping_lists
+from users.models import Follow, User
+
+
+class QueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Читатель', last_name='Тест', password='pass12345xx'
+        )
+        User.objects.bulk_create(
+            User(
+                username=f'author-{i}', email=f'author-{i}@example.com',
+                first_name='Автор', last_name=str(i)
+            )
+            for i in range(5)
+        )
+        authors = list(User.objects.filter(username__startswith='author-'))
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', slug=f'tag-{i}', color=f'#00000{i}')
+            for i in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(3)
+        ]
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=authors[i % len(authors)], name=f'Рецепт {i}',
+                text='Описание', cooking_time=10,
+                image='recipes/image/test.png'
+            )
+            for i in range(30)
+        )
+        recipes = list(Recipe.objects.all())
+        TagQuantity.objects.bulk_create(
+            TagQuantity(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in tags
+        )
+        IngredientQuantity.objects.bulk_create(
+            IngredientQuantity(recipe=recipe, ingredient=ingredient, amount=5)
+            for recipe in recipes for ingredient in ingredients
+        )
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.user, recipe=recipe) for recipe in recipes[::2]
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.user, recipe=recipe)
+            for recipe in recipes[::3]
+        )
+        Follow.objects.bulk_create(
+            Follow(user=cls.user, following=author) for author in authors[:2]
+        )
+        rebuild_shopping_lists()
+
+    def assertFlatQueries(self, client):
+        with CaptureQueriesContext(connection) as small:
+            response = client.get('/api/recipes/?limit=2')
+        self.assertEqual(len(response.data['results']), 2)
+        with self.assertNumQueries(len(small)):
+            response = client.get('/api/recipes/?limit=25')
+        self.assertEqual(len(response.data['results']), 25)
+
+    def test_anonymous_queries_do_not_grow_with_page_size(self):
+        self.assertFlatQueries(APIClient())
+
+    def test_authenticated_queries_do_not_grow_with_page_size(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertFlatQueries(client)
+
+    def test_download_cart_within_budget(self):
+        # Потоковый ответ не проверяет бюджет в строгом режиме,
+        # поэтому он проверяется здесь.
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                '/api/recipes/download_shopping_cart/',
+                HTTP_ACCEPT='text/plain'
+            )
+            content = b''.join(response.streaming_content).decode()
+        self.assertIn('Ингредиент 0', content)
+        self.assertLessEqual(
+            len(queries), settings.QUERY_BUDGETS['DownloadCart.download'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Нужен PostgreSQL')
+class IndexUsageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Автор', last_name='Тест'
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(100)
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=10, image='recipes/image/test.png'
+            )
+            for i in range(100)
+        )
+
+    def setUp(self):
+        # На маленькой таблице планировщик выберет полное сканирование,
+        # а тест проверяет, что индекс вообще применим к запросу.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_ingredient_name_prefix(self):
+        self.assertUsesIndex(
+            Ingredient.objects.filter(name__startswith='Инг'),
+            'ingredient_name_idx'
+        )
+
+    def test_recipe_feed_ordering(self):
+        self.assertUsesIndex(
+            Recipe.objects.order_by('-pub_date', '-id')[:6],
+            'recipe_pub_date_idx'
+        )
+
+    def test_recipe_author_lookup(self):
+        self.assertUsesIndex(
+            Recipe.objects.filter(author=self.author).order_by(
+                '-pub_date')[:3],
+            'recipe_author_pub_date_idx'
+        )
+
+
+class ShoppingListTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.buyer, cls.other = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                first_name='Тест', last_name=name
+            )
+            for name in ('author', 'buyer', 'other')
+        )
+        cls.tag = Tag.objects.create(name='Обед', slug='dinner', color='#000')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(3)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=10, image='recipes/image/test.png'
+            )
+            for i in range(2)
+        ]
+        for recipe, amounts in zip(cls.recipes, ((5, 3, 0), (0, 2, 4))):
+            IngredientQuantity.objects.bulk_create(
+                IngredientQuantity(
+                    recipe=recipe, ingredient=ingredient, amount=amount)
+                for ingredient, amount in zip(cls.ingredients, amounts)
+                if amount
+            )
+
+    def setUp(self):
+        self.clients = {}
+        for user in (self.author, self.buyer, self.other):
+            self.clients[user] = APIClient()
+            self.clients[user].force_authenticate(user)
+        for user in (self.buyer, self.other):
+            for recipe in self.recipes:
+                self.clients[user].post(
+                    f'/api/recipes/{recipe.id}/shopping_cart/')
+
+    def get_items(self):
+        return sorted(ShoppingListItem.objects.values_list(
+            'user_id', 'ingredient_id', 'amount'))
+
+    def assertMatchesRebuild(self):
+        items = self.get_items()
+        rebuild_shopping_lists()
+        self.assertEqual(items, self.get_items())
+        return items
+
+    def test_cart_add(self):
+        self.assertEqual(len(self.assertMatchesRebuild()), 6)
+
+    def test_cart_remove(self):
+        response = self.clients[self.buyer].delete(
+            f'/api/recipes/{self.recipes[0].id}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assertMatchesRebuild()
+
+    def test_cart_batch_remove(self):
+        response = self.clients[self.buyer].delete(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [recipe.id for recipe in self.recipes]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertMatchesRebuild()
+
+    def test_recipe_edit(self):
+        # Второй ингредиент есть и в другом рецепте корзины, поэтому
+        # двойное вычитание не спрячется за удалением строки списка.
+        first, _, third = self.ingredients
+        response = self.clients[self.author].patch(
+            f'/api/recipes/{self.recipes[0].id}/',
+            {
+                'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 5,
+                'tags': [self.tag.id],
+                'ingredients': [
+                    {'id': first.id, 'amount': 7},
+                    {'id': third.id, 'amount': 1},
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertMatchesRebuild()
+
+    def test_recipe_delete(self):
+        response = self.clients[self.author].delete(
+            f'/api/recipes/{self.recipes[0].id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertMatchesRebuild()
+
+    def test_ingredient_row_changes(self):
+        # Так строки рецепта меняются из админки.
+        row = IngredientQuantity.objects.get(
+            recipe=self.recipes[0], ingredient=self.ingredients[0])
+        row.amount = 9
+        row.save()
+        self.assertMatchesRebuild()
+        row.recipe = self.recipes[1]
+        row.save()
+        self.assertMatchesRebuild()
+        IngredientQuantity.objects.create(
+            recipe=self.recipes[0], ingredient=self.ingredients[2], amount=6)
+        self.assertMatchesRebuild()
+        row.delete()
+        self.assertMatchesRebuild()
+        self.ingredients[1].delete()
+        self.assertMatchesRebuild()
@@ -0,0 +1,64 @@
+from django.db.models import Case, CharField, F, IntegerField, Sum, Value, When
+
+# Единица из data/ingredients.csv -> (базовая единица, множитель).
+UNITS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'стакан': ('мл', 250),
+    'ст. л.': ('мл', 15),
+    'ч. л.': ('мл', 5),
+}
+
+# Базовая единица -> (единица для вывода, множитель, максимум).
+# Если максимум задан, единица используется только для количеств
+# не больше него и только когда количество делится нацело.
+DISPLAY_UNITS = {
+    'г': (('кг', 1000, None),),
+    'мл': (('л', 1000, None), ('ст. л.', 15, 150), ('ч. л.', 5, 30)),
+}
+
+
+def canonical_unit(field='ingredient__measurement_unit'):
+    return Case(
+        *(When(**{field: unit}, then=Value(canonical))
+          for unit, (canonical, _) in UNITS.items() if unit != canonical),
+        default=F(field),
+        output_field=CharField(),
+    )
+
+
+def unit_factor(field='ingredient__measurement_unit'):
+    return Case(
+        *(When(**{field: unit}, then=Value(factor))
+          for unit, (_, factor) in UNITS.items() if factor != 1),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+
+
+def normalize_amounts(queryset, amount='amount'):
+    return queryset.annotate(unit=canonical_unit()).values(
+        'ingredient__name', 'unit').order_by('ingredient__name').annotate(
+        total=Sum(F(amount) * unit_factor()))
+
+
+def humanize(amount, unit):
+    for display_unit, factor, limit in DISPLAY_UNITS.get(unit, ()):
+        if limit is None and amount >= factor:
+            value = round(amount / factor, 3)
+            return int(value) if value.is_integer() else value, display_unit
+        if limit is not None and amount <= limit and not amount % factor:
+            return amount // factor, display_unit
+    return amount, unit
+
+
+def humanize_amounts(rows):
+    for row in rows:
+        amount, unit = humanize(row['total'], row['unit'])
+        yield {
+            'ingredient__name': row['ingredient__name'],
+            'ingredient__measurement_unit': unit,
+            'ingredient_total': amount,
+        }
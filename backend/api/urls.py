@@ -3,8 +3,9 @@ from rest_framework.routers import DefaultRouter
 
 from users.views import CreateUserView, SubscribeViewSet
 
-from .views import (CartViewSet, DownloadCart, FavoriteViewSet,
-                    IngredientsViewSet, RecipeViewSet, TagsViewSet)
+from .views import (CartViewSet, DownloadCart, FavoriteViewSet, FeedViewSet,
+                    IngredientsViewSet, MatchRecipesViewSet, MetricsView,
+                    RecipeViewSet, TagsViewSet)
 
 app_name = 'api'
 router = DefaultRouter()
@@ -24,12 +25,25 @@ urlpatterns = [
     path('users/<users_id>/subscribe/',
          SubscribeViewSet.as_view({'post': 'create',
                                    'delete': 'delete'}), name='subscribe'),
-    path('recipes/<recipes_id>/favorite/',
+    path('recipes/feed/',
+         FeedViewSet.as_view({'get': 'list'}), name='feed'),
+    path('recipes/match/',
+         MatchRecipesViewSet.as_view({'get': 'list'}), name='match'),
+    path('recipes/favorite/',
+         FavoriteViewSet.as_view({'post': 'create_many',
+                                  'delete': 'delete_many'}),
+         name='favorites'),
+    path('recipes/shopping_cart/',
+         CartViewSet.as_view({'post': 'create_many',
+                              'delete': 'delete_many'}),
+         name='carts'),
+    path('recipes/<int:recipes_id>/favorite/',
          FavoriteViewSet.as_view({'post': 'create',
                                   'delete': 'delete'}), name='favorite'),
-    path('recipes/<recipes_id>/shopping_cart/',
+    path('recipes/<int:recipes_id>/shopping_cart/',
          CartViewSet.as_view({'post': 'create',
                               'delete': 'delete'}), name='cart'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,53 +1,166 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Prefetch
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import permissions
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from .filters import IngredientSearchFilter, RecipeFilter
+from users.models import Follow
+from .autocomplete import ingredient_index
+from .cache import CachedListMixin, get_or_build, get_version
+from .counters import recount
+from .exports import EXPORTERS
+from .filters import FilterSetBackend, RecipeFilter
+from .matching import match_recipes
+from .metrics import registry
 from .models import (Favorite, Ingredient, IngredientQuantity, Recipe,
-                     ShoppingCart, Tag)
-from .pagination import CustomPageNumberPagination
+                     ShoppingCart, ShoppingListItem, Tag)
+from .pagination import (CursorOrPageNumberPagination,
+                         CustomCursorPagination, CustomPageNumberPagination)
 from .permissions import IsAuthorOrReadOnly
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
 from .serializers import (FavoriteSerializer, IngredientSerializer,
-                          RecipeListSerializer, RecipeWriteSerializer,
+                          RecipeIdsSerializer, RecipeListSerializer,
+                          RecipeMatchSerializer,
+                          RecipeWriteSerializer,
                           ShoppingCartSerializer, TagSerializer)
+from .shopping_list import (add_recipes_to_shopping_list,
+                            remove_recipes_from_shopping_list)
+from .signals import skip_row_receivers
+from .units import humanize_amounts, normalize_amounts
 
 User = get_user_model()
 
 
-class TagsViewSet(ReadOnlyModelViewSet):
+class TagsViewSet(CachedListMixin, ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     permission_classes = (AllowAny,)
     pagination_class = None
     serializer_class = TagSerializer
+    cache_name = 'tags'
 
 
-class IngredientsViewSet(ReadOnlyModelViewSet):
+class IngredientsViewSet(CachedListMixin, ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     permission_classes = [AllowAny]
     serializer_class = IngredientSerializer
-    filter_backends = (DjangoFilterBackend, IngredientSearchFilter)
     pagination_class = None
-    search_fields = ['^name', ]
+    cache_name = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
 
 
 class RecipeViewSet(ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthorOrReadOnly]
     filter_class = RecipeFilter
-    filter_backends = [DjangoFilterBackend, ]
-    pagination_class = CustomPageNumberPagination
+    filter_backends = [FilterSetBackend]
+    pagination_class = CursorOrPageNumberPagination
+
+    @property
+    def cursor_ordering(self):
+        # Позиция курсора DRF берется из первого поля сортировки, а число
+        # добавлений в избранное неуникально и меняется между страницами.
+        if self.request.query_params.get('ordering') == 'popular':
+            raise ValidationError({'cursor': [
+                'Для сортировки по популярности используйте постраничную '
+                'навигацию.'
+            ]})
+        return Recipe._meta.ordering
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('facets') in ('1', 'true'):
+            response.data['facets'] = {
+                'tags': self.filterset.get_tag_counts()
+            }
+        return response
+
+    def get_base_queryset(self):
+        return Recipe.objects.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientrecipes',
+                queryset=IngredientQuantity.objects.select_related(
+                    'ingredient')
+            )
+        )
+
+    def get_viewer_flags(self):
+        user = self.request.user
+        return {
+            'is_favorited': Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            'is_in_shopping_cart': Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            'is_author_subscribed': Exists(Follow.objects.filter(
+                user=user, following=OuterRef('author'))),
+        }
+
+    def get_queryset(self):
+        queryset = self.get_base_queryset()
+        if self.request.user.is_anonymous:
+            return queryset
+        return queryset.annotate(**self.get_viewer_flags())
+
+    def get_detail_cache_key(self, pk):
+        return ':'.join(map(str, (
+            'recipe', pk, get_version(f'recipe:{pk}'), get_version('tags'),
+            get_version('ingredients'),
+            self.request.build_absolute_uri('/'),
+        )))
+
+    def build_detail(self, pk):
+        recipe = get_object_or_404(self.get_base_queryset(), pk=pk)
+        author_version = get_version(f'user:{recipe.author_id}')
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
+        recipe.is_author_subscribed = False
+        # Счетчики меняются при каждом добавлении в избранное или корзину
+        # и читаются вместе с отметками зрителя на каждый запрос.
+        recipe.favorites_count = recipe.carts_count = 0
+        data = RecipeListSerializer(
+            recipe, context=self.get_serializer_context()).data
+        return recipe.author_id, author_version, data
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.kwargs['pk']
+        if not pk.isdigit():
+            raise Http404
+        _, _, data = get_or_build(
+            self.get_detail_cache_key(pk),
+            lambda: self.build_detail(pk),
+            settings.RECIPE_CACHE_TIMEOUT,
+            lambda payload: get_version(f'user:{payload[0]}') == payload[1]
+        )
+        flags = {}
+        if request.user.is_authenticated:
+            flags = self.get_viewer_flags()
+        row = Recipe.objects.filter(pk=pk).values(
+            'favorites_count', 'carts_count', **flags).first()
+        if row is None:
+            raise Http404
+        data['favorites_count'] = row['favorites_count']
+        data['carts_count'] = row['carts_count']
+        if flags:
+            data['is_favorited'] = row['is_favorited']
+            data['is_in_shopping_cart'] = row['is_in_shopping_cart']
+            data['author']['is_subscribed'] = row['is_author_subscribed']
+        return Response(data)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -59,75 +172,216 @@ class RecipeViewSet(ModelViewSet):
             return RecipeWriteSerializer
 
 
+class MatchRecipesViewSet(RecipeViewSet):
+    filter_backends = []
+    pagination_class = CustomPageNumberPagination
+
+    def get_serializer_class(self):
+        return RecipeMatchSerializer
+
+    def get_ingredient_ids(self):
+        ids = {
+            int(value)
+            for values in self.request.query_params.getlist('ingredients')
+            for value in values.split(',') if value.strip().isdigit()
+        }
+        if not ids:
+            raise ValidationError(
+                {'ingredients': ['Укажите id имеющихся ингредиентов.']})
+        return ids
+
+    def list(self, request, *args, **kwargs):
+        ingredient_ids = self.get_ingredient_ids()
+        page = self.paginate_queryset(match_recipes(ingredient_ids))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        results = []
+        for recipe_id, matched, total in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched = matched
+            recipe.coverage = round(matched / total, 3)
+            recipe.missing = [
+                row.ingredient_id for row in recipe.ingredientrecipes.all()
+                if row.ingredient_id not in ingredient_ids
+            ]
+            results.append(recipe)
+        serializer = self.get_serializer(results, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class FeedViewSet(RecipeViewSet):
+    permission_classes = [IsAuthenticated]
+    pagination_class = CustomCursorPagination
+
+    @property
+    def cursor_ordering(self):
+        if settings.FEED_INBOX_ENABLED:
+            return ('-feed_pub_date', '-id')
+        return Recipe._meta.ordering
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if settings.FEED_INBOX_ENABLED:
+            # Сортировка по дате из FeedEntry позволяет читать ленту
+            # по индексу ящика, сколько бы авторов ни было в подписках.
+            return queryset.filter(feed_entries__user=user).annotate(
+                feed_pub_date=F('feed_entries__pub_date'))
+        return queryset.filter(author__following__user=user)
+
+
 class BaseFavoriteCartViewSet(ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    already_added_message = None
+    not_added_message = None
 
     def create(self, request, *args, **kwargs):
-        recipe_id = int(self.kwargs['recipes_id'])
-        recipe = get_object_or_404(Recipe, id=recipe_id)
-        self.model.objects.create(
-            user=request.user, recipe=recipe)
-        return Response(HTTPStatus.CREATED)
+        recipe = get_object_or_404(
+            Recipe.objects.only('id', 'name', 'image', 'cooking_time'),
+            id=self.kwargs['recipes_id']
+        )
+        try:
+            with transaction.atomic():
+                self.lock_user()
+                self.model.objects.create(user=request.user, recipe=recipe)
+        except IntegrityError:
+            return Response(
+                {'errors': self.already_added_message},
+                status=HTTPStatus.BAD_REQUEST
+            )
+        return Response(
+            self.get_serializer(recipe).data, status=HTTPStatus.CREATED)
 
     def delete(self, request, *args, **kwargs):
         recipe_id = self.kwargs['recipes_id']
-        user_id = request.user.id
-        object = get_object_or_404(
-            self.model, user__id=user_id, recipe__id=recipe_id)
-        object.delete()
-        return Response(HTTPStatus.NO_CONTENT)
+        with transaction.atomic():
+            self.lock_user()
+            deleted, _ = self.model.objects.filter(
+                user=request.user, recipe_id=recipe_id).delete()
+        if deleted:
+            return Response(status=HTTPStatus.NO_CONTENT)
+        get_object_or_404(Recipe, id=recipe_id)
+        return Response(
+            {'errors': self.not_added_message},
+            status=HTTPStatus.BAD_REQUEST
+        )
+
+    def lock_user(self):
+        # Все изменения избранного и корзины одного пользователя идут по
+        # очереди: иначе два параллельных запроса увидят одни и те же
+        # строки и дважды применят изменения к счетчикам и списку покупок.
+        User.objects.select_for_update().filter(
+            pk=self.request.user.pk).values_list('pk').get()
+
+    def get_recipe_ids(self):
+        serializer = RecipeIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        return set(serializer.validated_data['recipes'])
+
+    def create_many(self, request, *args, **kwargs):
+        recipe_ids = self.get_recipe_ids()
+        found = set(Recipe.objects.filter(
+            id__in=recipe_ids).values_list('id', flat=True))
+        with transaction.atomic():
+            self.lock_user()
+            existing = set(self.model.objects.filter(
+                user=request.user, recipe_id__in=found
+            ).values_list('recipe_id', flat=True))
+            added = found - existing
+            self.model.objects.bulk_create(
+                self.model(user=request.user, recipe_id=recipe_id)
+                for recipe_id in added
+            )
+            # bulk_create не отправляет сигналы, поэтому счетчики
+            # и список покупок обновляются здесь.
+            recount(Recipe.objects.filter(id__in=added))
+            self.change_shopping_list(added, added=True)
+        return Response({
+            'added': sorted(added),
+            'existing': sorted(existing),
+            'not_found': sorted(recipe_ids - found),
+        }, status=HTTPStatus.CREATED)
+
+    def delete_many(self, request, *args, **kwargs):
+        recipe_ids = self.get_recipe_ids()
+        rows = self.model.objects.filter(
+            user=request.user, recipe_id__in=recipe_ids)
+        with transaction.atomic():
+            self.lock_user()
+            removed = set(rows.values_list('recipe_id', flat=True))
+            self.change_shopping_list(removed, added=False)
+            with skip_row_receivers():
+                rows.delete()
+            recount(Recipe.objects.filter(id__in=removed))
+        return Response({
+            'removed': sorted(removed),
+            'not_added': sorted(recipe_ids - removed),
+        })
+
+    def change_shopping_list(self, recipe_ids, added):
+        pass
 
 
 class CartViewSet(BaseFavoriteCartViewSet):
     serializer_class = ShoppingCartSerializer
     queryset = ShoppingCart.objects.all()
     model = ShoppingCart
+    already_added_message = 'Рецепт уже в списке покупок.'
+    not_added_message = 'Рецепта нет в списке покупок.'
+
+    def change_shopping_list(self, recipe_ids, added):
+        if not recipe_ids:
+            return
+        if added:
+            add_recipes_to_shopping_list(self.request.user.id, recipe_ids)
+        else:
+            remove_recipes_from_shopping_list(
+                self.request.user.id, recipe_ids)
 
 
 class FavoriteViewSet(BaseFavoriteCartViewSet):
-    pagination_class = CustomPageNumberPagination
     serializer_class = FavoriteSerializer
     queryset = Favorite.objects.all()
     model = Favorite
+    already_added_message = 'Рецепт уже в избранном.'
+    not_added_message = 'Рецепта нет в избранном.'
 
 
 class DownloadCart(ModelViewSet):
     permission_classes = [IsAuthenticated]
+    renderer_classes = [
+        PDFRenderer, PlainTextRenderer, CSVRenderer, JSONRenderer
+    ]
 
-    @staticmethod
-    def canvas_method(dictionary):
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; '
-        'filename = "shopping_cart.pdf"'
-        begin_position_x, begin_position_y = 40, 650
-        sheet = canvas.Canvas(response, pagesize=A4)
-        pdfmetrics.registerFont(TTFont('FreeSans',
-                                       'data/FreeSans.ttf'))
-        sheet.setFont('FreeSans', 50)
-        sheet.setTitle('Список покупок')
-        sheet.drawString(begin_position_x,
-                         begin_position_y + 40, 'Список покупок: ')
-        sheet.setFont('FreeSans', 24)
-        for number, item in enumerate(dictionary, start=1):
-            if begin_position_y < 100:
-                begin_position_y = 700
-                sheet.showPage()
-                sheet.setFont('FreeSans', 24)
-            sheet.drawString(
-                begin_position_x,
-                begin_position_y,
-                f'{number}.  {item["ingredient__name"]} - '
-                f'{item["ingredient_total"]}'
-                f' {item["ingredient__measurement_unit"]}'
-            )
-            begin_position_y -= 30
-        sheet.showPage()
-        sheet.save()
-        return response
+    def handle_exception(self, exc):
+        self.request.accepted_renderer = JSONRenderer()
+        self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
 
     def download(self, request):
-        result = IngredientQuantity.objects.filter(
-            recipe__carts__user=request.user).values(
-            'ingredient__name', 'ingredient__measurement_unit').order_by(
-                'ingredient__name').annotate(ingredient_total=Sum('amount'))
-        return self.canvas_method(result)
+        result = normalize_amounts(
+            ShoppingListItem.objects.filter(user=request.user))
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            EXPORTERS[renderer.format](humanize_amounts(result.iterator())),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"'
+        )
+        return response
+
+
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(
+            registry.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
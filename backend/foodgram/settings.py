@@ -21,7 +21,6 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
-    'debug_toolbar',
     'djoser',
     'django_filters',
     'api',
@@ -29,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -36,9 +36,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -71,6 +74,53 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    }
+}
+
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_INDEX_TIMEOUT = 60
+
+CATALOG_CACHE_MAX_AGE = 60
+CATALOG_CACHE_TIMEOUT = 5 * 60
+
+RECIPE_IMAGE_RENDITIONS = {'small': 160, 'medium': 480}
+RECIPE_IMAGE_FORMATS = ('webp', 'jpeg')
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+
+# Алиас кэша из CACHES, общего для всех воркеров (memcached, Redis).
+# Без него токены проверяются в базе на каждом запросе.
+AUTH_TOKEN_CACHE = os.environ.get('AUTH_TOKEN_CACHE')
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+RECIPE_CACHE_TIMEOUT = 600
+
+# 'index' - обратный индекс в памяти процесса, 'sql' - GROUP BY в базе.
+RECIPE_MATCH_BACKEND = os.environ.get('RECIPE_MATCH_BACKEND', 'index')
+RECIPE_MATCH_INDEX_TIMEOUT = 60
+
+# Лента подписок читается через Follow. Для пользователей с тысячами
+# подписок ее можно хранить в материализованных ящиках FeedEntry.
+FEED_INBOX_ENABLED = bool(os.environ.get('FEED_INBOX_ENABLED'))
+FEED_INBOX_BACKFILL = 200
+FEED_INBOX_BATCH_SIZE = 1000
+
+QUERY_BUDGETS = {
+    'TagsViewSet.list': 2,
+    'IngredientsViewSet.list': 2,
+    'RecipeViewSet.list': 7,
+    'RecipeViewSet.retrieve': 6,
+    'SubscribeViewSet.list': 5,
+    'DownloadCart.download': 2,
+    'MatchRecipesViewSet.list': 6,
+    'FeedViewSet.list': 6,
+}
+QUERY_BUDGETS_STRICT = bool(os.environ.get('QUERY_BUDGETS_STRICT'))
+
 AUTH_USER_MODEL = 'users.User'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -93,7 +143,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS':
         'api.pagination.CustomPageNumberPagination',
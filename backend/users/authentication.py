@@ -0,0 +1,78 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from users.models import User
+
+
+def get_token_cache_key(key):
+    return f'auth-token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def get_token_cache():
+    if settings.AUTH_TOKEN_CACHE is None:
+        return None
+    token_cache = caches[settings.AUTH_TOKEN_CACHE]
+    # Выход из системы сбрасывает кэш только в том процессе, который его
+    # обработал. С локальным кэшем остальные воркеры принимали бы
+    # отозванный токен до истечения таймаута.
+    if isinstance(token_cache, LocMemCache):
+        raise ImproperlyConfigured(
+            'AUTH_TOKEN_CACHE должен указывать на кэш, общий для всех '
+            'процессов.'
+        )
+    return token_cache
+
+
+class UserSnapshot:
+    __slots__ = (
+        'id', 'username', 'email', 'first_name', 'last_name',
+        'is_active', 'is_staff', 'is_superuser'
+    )
+
+    @classmethod
+    def from_user(cls, user):
+        snapshot = cls()
+        for name in cls.__slots__:
+            setattr(snapshot, name, getattr(user, name))
+        return snapshot
+
+    def to_user(self):
+        # Model.from_db ждет значения в порядке полей модели. Остальные
+        # поля пользователя отложены и загрузятся только при обращении.
+        field_names = [
+            field.attname for field in User._meta.concrete_fields
+            if field.attname in self.__slots__
+        ]
+        return User.from_db(
+            DEFAULT_DB_ALIAS, field_names,
+            [getattr(self, name) for name in field_names]
+        )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        token_cache = get_token_cache()
+        if token_cache is None:
+            return super().authenticate_credentials(key)
+        cache_key = get_token_cache_key(key)
+        snapshot = token_cache.get(cache_key)
+        if snapshot is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(
+                cache_key, UserSnapshot.from_user(user),
+                settings.AUTH_TOKEN_CACHE_TIMEOUT
+            )
+            return user, token
+        if not snapshot.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        user = snapshot.to_user()
+        return user, Token(key=key, user=user)
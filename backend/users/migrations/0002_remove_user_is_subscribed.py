@@ -0,0 +1,17 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:04
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='is_subscribed',
+        ),
+    ]
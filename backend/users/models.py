@@ -23,10 +23,6 @@ class User(AbstractUser):
         max_length=150,
         verbose_name='Фамилия',
         help_text='Введите фамилию пользователя')
-    is_subscribed = models.BooleanField(
-        default=False,
-        verbose_name='Подписка на данного пользователя',
-        help_text='Отметьте для подписки на данного пользователя')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name', 'password']
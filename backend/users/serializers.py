@@ -1,10 +1,26 @@
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 
+from api.images import ImageRenditionsField
 from api.models import Recipe
 from .models import Follow, User
 
 
+def get_followed_ids(context):
+    # Контекст общий для всех вложенных сериализаторов, поэтому подписки
+    # зрителя загружаются не больше одного раза за запрос.
+    followed_ids = context.get('followed_ids')
+    if followed_ids is None:
+        request = context.get('request')
+        if request is None or request.user.is_anonymous:
+            followed_ids = frozenset()
+        else:
+            followed_ids = frozenset(Follow.objects.filter(
+                user=request.user).values_list('following_id', flat=True))
+        context['followed_ids'] = followed_ids
+    return followed_ids
+
+
 class CustomUserCreateSerializer(UserCreateSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
@@ -22,14 +38,9 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         return result
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        if Follow.objects.filter(
-                user=request.user, following__id=obj.id).exists():
-            return True
-        else:
-            return False
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
+        return obj.id in get_followed_ids(self.context)
 
 
 class CustomUserSerializer(UserSerializer):
@@ -41,16 +52,12 @@ class CustomUserSerializer(UserSerializer):
             'id', 'email', 'username', 'first_name',
             'last_name', 'is_subscribed', 'password'
         )
+        extra_kwargs = {'password': {'write_only': True}}
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        if Follow.objects.filter(
-                user=request.user, following__id=obj.id).exists():
-            return True
-        else:
-            return False
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
+        return obj.id in get_followed_ids(self.context)
 
     def to_representation(self, obj):
         result = super(CustomUserSerializer, self).to_representation(obj)
@@ -59,12 +66,15 @@ class CustomUserSerializer(UserSerializer):
 
 
 class FollowRecipesSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class FollowSerializer(serializers.ModelSerializer):
+    is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
 
@@ -73,13 +83,23 @@ class FollowSerializer(serializers.ModelSerializer):
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count')
 
+    def get_is_subscribed(self, obj):
+        return True
+
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.only('id', 'name', 'image', 'cooking_time')
-        if limit:
-            recipes = recipes[:int(limit)]
+        recent_recipes = self.context.get('recent_recipes')
+        if recent_recipes is not None:
+            recipes = recent_recipes[obj.id]
+        else:
+            request = self.context.get('request')
+            limit = request.query_params.get('recipes_limit', '')
+            recipes = obj.recipes.only(
+                'id', 'name', 'image', 'image_renditions', 'cooking_time')
+            if limit.isdigit():
+                recipes = recipes[:int(limit)]
         return FollowRecipesSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
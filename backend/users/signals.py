@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.authentication import get_token_cache, get_token_cache_key
+from users.models import User
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    token_cache = get_token_cache()
+    if token_cache is not None:
+        token_cache.delete(get_token_cache_key(instance.key))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    token_cache = get_token_cache()
+    if token_cache is None:
+        return
+    token_cache.delete_many([
+        get_token_cache_key(key) for key in Token.objects.filter(
+            user_id=instance.pk).values_list('key', flat=True)
+    ])
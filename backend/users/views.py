@@ -1,12 +1,14 @@
+from collections import defaultdict
 from http import HTTPStatus
 
-from django.shortcuts import get_list_or_404, get_object_or_404
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
-from rest_framework import viewsets
+from rest_framework import permissions, viewsets
 from rest_framework.response import Response
 
-from api.permissions import IsAuthorOrReadOnly
-from api.pagination import CustomPageNumberPagination
+from api.models import Recipe
+from api.pagination import CursorOrPageNumberPagination
 from users.models import Follow, User
 from users.serializers import CustomUserCreateSerializer, FollowSerializer
 
@@ -15,16 +17,49 @@ class CreateUserView(UserViewSet):
     serializer_class = CustomUserCreateSerializer
 
     def get_queryset(self):
-        return User.objects.all()
+        user = self.request.user
+        if user.is_anonymous:
+            return User.objects.all()
+        return User.objects.annotate(subscribed=Exists(
+            Follow.objects.filter(user=user, following=OuterRef('pk'))))
 
 
 class SubscribeViewSet(viewsets.ModelViewSet):
-    pagination_class = CustomPageNumberPagination
-    permission_classes = [IsAuthorOrReadOnly]
+    pagination_class = CursorOrPageNumberPagination
+    permission_classes = [permissions.IsAuthenticated]
     serializer_class = FollowSerializer
+    cursor_ordering = ('-id',)
 
     def get_queryset(self):
-        return get_list_or_404(User, following__user=self.request.user)
+        return User.objects.filter(
+            following__user=self.request.user).annotate(
+            recipes_count=Count('recipes')).order_by('-id')
+
+    def get_recent_recipes(self, authors):
+        if not authors:
+            return {}
+        recipes = Recipe.objects.filter(author__in=authors).only(
+            'id', 'author', 'name', 'image', 'image_renditions',
+            'cooking_time')
+        limit = self.request.query_params.get('recipes_limit', '')
+        if limit.isdigit():
+            # Подзапрос для каждого автора читает по индексу
+            # (author, -pub_date) только его последние рецепты.
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(author=OuterRef('author')).order_by(
+                    '-pub_date', '-id').values('pk')[:int(limit)]
+            ))
+        recent_recipes = defaultdict(list)
+        for recipe in recipes:
+            recent_recipes[recipe.author_id].append(recipe)
+        return recent_recipes
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        context = self.get_serializer_context()
+        context['recent_recipes'] = self.get_recent_recipes(page)
+        serializer = self.get_serializer(page, many=True, context=context)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         user_id = self.kwargs.get('users_id')